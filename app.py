@@ -1,15 +1,38 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from openai import OpenAI
-from sqlalchemy import Column, Integer, Float, Text, String
-from sqlalchemy.exc import IntegrityError
+from openai import APIConnectionError, APIStatusError, APITimeoutError, InternalServerError, OpenAI, RateLimitError
+from sqlalchemy import Boolean, Column, Integer, Float, Text, String, insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
 
 # Load .env file
 load_dotenv()
 
-# Initialize OpenAI
-client = OpenAI()
+# Leveled logfmt-style logging; LOG_LEVEL=DEBUG also logs prompts and replies
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='ts=%(asctime)s level=%(levelname)s logger=%(name)s msg=%(message)s',
+                    datefmt='%Y-%m-%dT%H:%M:%S%z')
+logger = logging.getLogger('persona_assistent')
+
+# Initialize OpenAI. Retries are handled by the upstream scheduler below.
+client = OpenAI(max_retries=0)
 
 """client = OpenAI()
 
@@ -20,9 +43,400 @@ response = client.responses.create(
 print(response.output_text)"""
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///personas.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///personas.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Response cache for /personas/<id>/prompt
+app.config['PROMPT_CACHE_MAX_ENTRIES'] = int(os.environ.get('PROMPT_CACHE_MAX_ENTRIES', 512))
+app.config['PROMPT_CACHE_TTL_SECONDS'] = int(os.environ.get('PROMPT_CACHE_TTL_SECONDS', 24 * 60 * 60))
+# Delete expired prompt_cache rows at startup and after every N cache writes
+app.config['PROMPT_CACHE_PURGE_EVERY'] = int(os.environ.get('PROMPT_CACHE_PURGE_EVERY', 100))
+
+# Background prompt jobs (POST /personas/<id>/prompt?async=1)
+app.config['PROMPT_WORKERS'] = int(os.environ.get('PROMPT_WORKERS', 4))
+app.config['PROMPT_QUEUE_DEPTH'] = int(os.environ.get('PROMPT_QUEUE_DEPTH', 64))
+app.config['JOB_MAX_WAIT_SECONDS'] = int(os.environ.get('JOB_MAX_WAIT_SECONDS', 30))
+
+# One message against many personas (POST /personas/prompt-batch)
+app.config['BATCH_DEFAULT_CONCURRENCY'] = int(os.environ.get('BATCH_DEFAULT_CONCURRENCY', 4))
+app.config['BATCH_MAX_CONCURRENCY'] = int(os.environ.get('BATCH_MAX_CONCURRENCY', 16))
+app.config['BATCH_MAX_PERSONAS'] = int(os.environ.get('BATCH_MAX_PERSONAS', 500))
+
+# Persona list paging (GET /personas?limit=...&after=...)
+app.config['PERSONA_PAGE_MAX_LIMIT'] = int(os.environ.get('PERSONA_PAGE_MAX_LIMIT', 500))
+
+# Bulk import/export (POST /personas/bulk, GET /personas/export)
+app.config['BULK_IMPORT_BATCH_SIZE'] = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', 1000))
+app.config['BULK_IMPORT_MAX_ERRORS'] = int(os.environ.get('BULK_IMPORT_MAX_ERRORS', 1000))
+app.config['EXPORT_FETCH_SIZE'] = int(os.environ.get('EXPORT_FETCH_SIZE', 1000))
+
+# Multi-turn conversations (POST /personas/<id>/conversations/<cid>/messages)
+app.config['CONVERSATION_HISTORY_TOKEN_BUDGET'] = int(os.environ.get('CONVERSATION_HISTORY_TOKEN_BUDGET', 4000))
+app.config['CONVERSATION_SUMMARIZE'] = os.environ.get('CONVERSATION_SUMMARIZE', '1') == '1'
+app.config['CONVERSATION_SUMMARY_MAX_TOKENS'] = int(os.environ.get('CONVERSATION_SUMMARY_MAX_TOKENS', 500))
+
+# Upstream scheduler in front of the OpenAI client; set the rate limits to your account's tier
+app.config['UPSTREAM_REQUESTS_PER_MINUTE'] = int(os.environ.get('UPSTREAM_REQUESTS_PER_MINUTE', 500))
+app.config['UPSTREAM_TOKENS_PER_MINUTE'] = int(os.environ.get('UPSTREAM_TOKENS_PER_MINUTE', 500000))
+app.config['UPSTREAM_MAX_RETRIES'] = int(os.environ.get('UPSTREAM_MAX_RETRIES', 4))
+app.config['UPSTREAM_BACKOFF_BASE_SECONDS'] = float(os.environ.get('UPSTREAM_BACKOFF_BASE_SECONDS', 0.5))
+app.config['UPSTREAM_BACKOFF_MAX_SECONDS'] = float(os.environ.get('UPSTREAM_BACKOFF_MAX_SECONDS', 20))
+app.config['UPSTREAM_INITIAL_CONCURRENCY'] = int(os.environ.get('UPSTREAM_INITIAL_CONCURRENCY', 8))
+app.config['UPSTREAM_MAX_CONCURRENCY'] = int(os.environ.get('UPSTREAM_MAX_CONCURRENCY', 32))
+
+LLM_MODEL = 'gpt-5-mini'
+LLM_MAX_COMPLETION_TOKENS = 2000  # Increased to allow for reasoning + response
+
+
+class Metrics:
+    """Small thread-safe registry of labelled counters and histograms.
+
+    render() produces the Prometheus text exposition format served on
+    /metrics, so no client library is needed.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}  # name -> (type, help)
+        self._counters = {}  # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket counts..., sum, count]}
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+        (self._counters if kind == 'counter' else self._histograms).setdefault(name, {})
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(self.BUCKETS) + 2)
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def format_sample(name, labels, value):
+        if labels:
+            label_text = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                  for k, v in labels)
+            return f'{name}{{{label_text}}} {value}'
+        return f'{name} {value}'
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self._meta.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                if kind == 'counter':
+                    for labels, value in self._counters[name].items():
+                        lines.append(self.format_sample(name, labels, value))
+                    continue
+                for labels, state in self._histograms[name].items():
+                    for bound, count in zip(self.BUCKETS, state):
+                        lines.append(self.format_sample(f'{name}_bucket', labels + (('le', bound),), count))
+                    lines.append(self.format_sample(f'{name}_bucket', labels + (('le', '+Inf'),), state[-1]))
+                    lines.append(self.format_sample(f'{name}_sum', labels, round(state[-2], 6)))
+                    lines.append(self.format_sample(f'{name}_count', labels, state[-1]))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+metrics.describe('http_request_duration_seconds', 'histogram',
+                 'Time to produce the response (headers for streamed responses), by route.')
+metrics.describe('persona_prompt_phase_seconds', 'histogram',
+                 'Time spent in each phase of a persona prompt: db_lookup, prompt_build, summarize, upstream.')
+metrics.describe('openai_requests_total', 'counter', 'OpenAI chat completion calls by outcome.')
+metrics.describe('openai_tokens_total', 'counter', 'Tokens reported by OpenAI usage, by kind.')
+metrics.describe('upstream_retries_total', 'counter', 'Upstream calls retried by the scheduler, by error type.')
+metrics.describe('upstream_coalesced_total', 'counter', 'Requests that shared an identical in-flight upstream call.')
+metrics.describe('upstream_throttle_wait_seconds_total', 'counter',
+                 'Time spent waiting for rate limit budget, by bucket.')
+
+
+def record_usage(usage):
+    """Count the tokens from an OpenAI usage object (or its dict form)."""
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = {'prompt_tokens': usage.prompt_tokens, 'completion_tokens': usage.completion_tokens}
+    for kind in ('prompt', 'completion'):
+        metrics.inc('openai_tokens_total', usage.get(f'{kind}_tokens') or 0, kind=kind)
+
+
+class TokenBucket:
+    """Per-minute budget that refills continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        """Block until amount is available and take it. Returns the seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def refund(self, amount):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to upstream health (AIMD).
+
+    Each healthy call raises the limit by 1/limit, so roughly +1 per round
+    trip. Throttling or server errors halve it. Latency only shrinks it (by
+    10%) when the recent average stays above twice the long-run average for
+    several calls in a row, so the normal spread of LLM latencies is ignored.
+    """
+
+    SHORT_WEIGHT = 0.2     # EWMA over roughly the last 5 calls
+    LONG_WEIGHT = 0.01     # EWMA over roughly the last 100 calls
+    SLOW_STREAK = 10       # consecutive slow calls before shrinking
+
+    def __init__(self, initial, minimum, maximum):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._samples = 0
+        self._short = None
+        self._long = None
+        self._slow_streak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, overloaded=False):
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self._samples += 1
+                if self._long is None:
+                    self._short = self._long = latency
+                self._short += (latency - self._short) * self.SHORT_WEIGHT
+                # A plain running mean until there are enough samples for the long EWMA
+                self._long += (latency - self._long) * max(self.LONG_WEIGHT, 1 / self._samples)
+                if self._short > 2 * self._long:
+                    # Hold the limit while slow; shrink once the slowdown persists
+                    self._slow_streak += 1
+                    if self._slow_streak >= self.SLOW_STREAK:
+                        self.limit = max(self.minimum, self.limit * 0.9)
+                        self._slow_streak = 0
+                else:
+                    self._slow_streak = 0
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token plus per-message overhead)."""
+    return len(text) // 4 + 4
+
+
+class UpstreamScheduler:
+    """Shared gate in front of client.chat.completions.create.
+
+    - requests/minute and tokens/minute token buckets; a call reserves its
+      estimated prompt tokens plus max_completion_tokens and unused tokens
+      are refunded from the reported usage
+    - retries of 429, 5xx, timeouts and connection errors with full-jitter
+      exponential backoff; a Retry-After from a 429 pauses all callers
+    - identical in-flight non-streaming requests are coalesced into one call
+    - concurrency adapts to observed latency and error rates
+
+    Non-streaming calls are counted in openai_requests_total and
+    openai_tokens_total once, by the caller that made the upstream call.
+    A stream's outcome is only known when it ends, so its reader counts it.
+    """
+
+    RETRYABLE = (RateLimitError, InternalServerError, APITimeoutError, APIConnectionError)
+
+    def __init__(self, client, requests_per_minute, tokens_per_minute, max_retries=4, backoff_base=0.5,
+                 backoff_max=20.0, initial_concurrency=8, max_concurrency=32):
+        self.client = client
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = AdaptiveLimiter(initial_concurrency, 1, max_concurrency)
+        self._paused_until = 0.0
+        self._in_flight = {}  # request key -> Future
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_request_tokens(kwargs):
+        """Tokens to reserve for a call: its messages plus the most it may generate."""
+        prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in kwargs.get('messages', []))
+        return prompt_tokens + (kwargs.get('max_completion_tokens') or 0)
+
+    def create(self, **kwargs):
+        """Call client.chat.completions.create(**kwargs) through the gate.
+
+        Returns (response, coalesced). coalesced is True when the response
+        was shared from another caller's identical in-flight request; that
+        caller already counted it and should be the only one to store it.
+        """
+        if kwargs.get('stream'):
+            return self._call(kwargs), False
+
+        key = hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            metrics.inc('upstream_coalesced_total')
+            return future.result(), True
+
+        try:
+            response = self._call(kwargs)
+            future.set_result(response)
+        except BaseException as e:
+            metrics.inc('openai_requests_total', outcome='error')
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        metrics.inc('openai_requests_total', outcome='ok')
+        record_usage(response.usage)
+        return response, False
+
+    def _retry_after(self, error):
+        if not isinstance(error, APIStatusError):
+            return None
+        headers = error.response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after'):
+                return float(headers['retry-after'])
+        except ValueError:
+            pass  # HTTP-date form; fall back to backoff
+        return None
+
+    def _wait_if_paused(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            metrics.inc('upstream_throttle_wait_seconds_total', delay, bucket='retry_after')
+            time.sleep(delay)
+
+    def _call(self, kwargs):
+        cost = self.estimate_request_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            self._wait_if_paused()
+            waited = self.requests.acquire(1)
+            if waited:
+                metrics.inc('upstream_throttle_wait_seconds_total', waited, bucket='requests')
+            waited = self.tokens.acquire(cost)
+            if waited:
+                metrics.inc('upstream_throttle_wait_seconds_total', waited, bucket='tokens')
+
+            started = time.monotonic()
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except self.RETRYABLE as e:
+                self.limiter.release(overloaded=True)
+                # A rejected call does not spend the token budget
+                self.tokens.refund(cost)
+                retry_after = self._retry_after(e)
+                if retry_after is not None:
+                    retry_after = min(retry_after, self.backoff_max)
+                    if isinstance(e, RateLimitError):
+                        with self._lock:
+                            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if attempt == self.max_retries:
+                    raise
+                delay = retry_after if retry_after is not None else random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                metrics.inc('upstream_retries_total', error=type(e).__name__)
+                logger.info('upstream_retry attempt=%d error=%s delay_s=%.2f', attempt + 1, type(e).__name__, delay)
+                time.sleep(delay)
+                continue
+            except Exception:
+                self.limiter.release()
+                raise
+
+            # For streams this is time to headers; the slot is not held while tokens arrive
+            self.limiter.release(latency=time.monotonic() - started)
+            # A stream reports usage in its last chunk; its reader calls refund()
+            if not kwargs.get('stream'):
+                self.refund(kwargs, response.usage)
+            return response
+
+    def refund(self, kwargs, usage):
+        """Return the unused part of a call's token reservation once its usage is known.
+
+        usage is an OpenAI usage object or its dict form; None refunds nothing.
+        """
+        if isinstance(usage, dict):
+            total = usage.get('total_tokens')
+        else:
+            total = getattr(usage, 'total_tokens', None)
+        if total is not None:
+            self.tokens.refund(max(0, self.estimate_request_tokens(kwargs) - total))
+
+
+upstream = UpstreamScheduler(
+    client,
+    requests_per_minute=app.config['UPSTREAM_REQUESTS_PER_MINUTE'],
+    tokens_per_minute=app.config['UPSTREAM_TOKENS_PER_MINUTE'],
+    max_retries=app.config['UPSTREAM_MAX_RETRIES'],
+    backoff_base=app.config['UPSTREAM_BACKOFF_BASE_SECONDS'],
+    backoff_max=app.config['UPSTREAM_BACKOFF_MAX_SECONDS'],
+    initial_concurrency=app.config['UPSTREAM_INITIAL_CONCURRENCY'],
+    max_concurrency=app.config['UPSTREAM_MAX_CONCURRENCY']
+)
+
+
 db = SQLAlchemy(app)
 
 
@@ -31,7 +445,7 @@ class Persona(db.Model):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False)
     location = Column(Text, nullable=True)
-    annual_income = Column(Float, nullable=True)
+    annual_income = Column(Float, nullable=True, index=True)
     extras = Column(Text, nullable=True)
 
     def to_dict(self):
@@ -44,9 +458,584 @@ class Persona(db.Model):
         }
 
 
+PERSONA_FIELDS = ('id', 'name', 'location', 'annual_income', 'extras')
+
+
+class TableVersion(db.Model):
+    """Per-table write counter, bumped in the same transaction as the write. Used for ETags."""
+    __tablename__ = 'table_versions'
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+def bump_table_version(name):
+    """Increment a table's version counter. The caller commits the session."""
+    TableVersion.query.filter_by(name=name).update({'version': TableVersion.version + 1})
+
+
+def get_table_version(name):
+    row = db.session.get(TableVersion, name)
+    return row.version if row else 0
+
+
+class PromptCacheEntry(db.Model):
+    __tablename__ = 'prompt_cache'
+    key = Column(String(64), primary_key=True)
+    persona_id = Column(Integer, nullable=False, index=True)
+    response = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+
+class ResponseCache:
+    """Two-tier cache for persona prompt completions.
+
+    The first tier is an in-process LRU with a TTL, the second is the
+    prompt_cache table so entries survive restarts. Every entry is tagged
+    with its persona id so edits can drop everything rendered from the
+    old persona details.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, purge_every):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.purge_every = purge_every
+        self._writes = 0
+        self._entries = OrderedDict()  # key -> (persona_id, created_at, response)
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'bypassed': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(model, system_prompt, user_message):
+        h = hashlib.sha256()
+        for part in (model, system_prompt, user_message):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, persona_id, created_at, response):
+        with self._lock:
+            self._entries[key] = (persona_id, created_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry[2]
+                del self._entries[key]
+
+        row = db.session.get(PromptCacheEntry, key)
+        if row is not None:
+            if now - row.created_at < self.ttl_seconds:
+                self._remember(key, row.persona_id, row.created_at, row.response)
+                self.count('db_hits')
+                return row.response
+            db.session.delete(row)
+            db.session.commit()
+
+        self.count('misses')
+        return None
+
+    def set(self, key, persona_id, response):
+        created_at = time.time()
+        self._remember(key, persona_id, created_at, response)
+        # Upsert, since concurrent identical prompts can both miss and both write
+        stmt = sqlite_insert(PromptCacheEntry).values(key=key, persona_id=persona_id, response=response,
+                                                      created_at=created_at)
+        stmt = stmt.on_conflict_do_update(index_elements=['key'], set_={
+            'persona_id': stmt.excluded.persona_id,
+            'response': stmt.excluded.response,
+            'created_at': stmt.excluded.created_at
+        })
+        db.session.execute(stmt)
+        db.session.commit()
+
+        with self._lock:
+            self._writes += 1
+            purge = self.purge_every > 0 and self._writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self):
+        """Delete expired rows from prompt_cache; lookups only drop the key they hit."""
+        deleted = PromptCacheEntry.query.filter(
+            PromptCacheEntry.created_at < time.time() - self.ttl_seconds).delete()
+        db.session.commit()
+        if deleted:
+            logger.info('prompt_cache_purged rows=%d', deleted)
+        return deleted
+
+    def try_set(self, key, persona_id, response):
+        """Like set(), but a failed cache write is logged and ignored so it never fails the request."""
+        try:
+            self.set(key, persona_id, response)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning('prompt_cache_write_failed persona_id=%s error=%r', persona_id, str(e))
+
+    def invalidate_persona(self, persona_id):
+        """Drop all entries for a persona. The caller commits the session."""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[0] == persona_id]:
+                del self._entries[key]
+            self.stats['invalidations'] += 1
+        PromptCacheEntry.query.filter_by(persona_id=persona_id).delete()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._entries))
+
+
+response_cache = ResponseCache(app.config['PROMPT_CACHE_MAX_ENTRIES'], app.config['PROMPT_CACHE_TTL_SECONDS'],
+                               app.config['PROMPT_CACHE_PURGE_EVERY'])
+
+
+def build_system_prompt(persona):
+    """Render the system prompt with the persona details.
+
+    The result depends only on the persona, so it is a stable prefix for
+    every request (and every conversation turn) against that persona.
+    """
+    persona_texts = [f"Name: {persona.name}"]
+    if persona.location:
+        persona_texts.append(f"Location: {persona.location}")
+    if persona.annual_income is not None:
+        persona_texts.append(f"Annual Income: {persona.annual_income}")
+    if persona.extras:
+        persona_texts.append(f"Extras: {persona.extras}")
+    # One detail per line rather than the list repr, so the rendered prompt is
+    # byte-identical across calls and provider-side prompt caching can hit
+    persona_details = '\n'.join(persona_texts)
+
+    return f"""You are an AI assistant with extensive business consultancy experience.
+Your role is to help identify the ideal customer types most likely to purchase my products.
+Create five detailed buyer personas and recommend them to me.
+
+For each persona you embody:
+
+Respond realistically and conversationally.
+
+Do not automatically show interest in every product.
+
+Only express interest or willingness to buy if the product genuinely fits the persona’s needs, goals, and context.
+
+If the product does not align with the persona, explain why—naturally and in character.
+
+After creating the personas, you will adopt the one I select and respond strictly from that persona’s point of view.
+
+Below is the information for the company you will assist with the ideal personas 
+{persona_details}
+
+Respond should be a text with the following format: 
+Short description of the company as a persona with address, annual Annual turnover and number of employees. 
+Relevant Contact Person in the company and their department 
+How to approach them 
+
+"""
+
+
+def cache_requested(data):
+    """A request opts out of the response cache with "cache": false or Cache-Control: no-cache."""
+    return data.get('cache', True) is not False and 'no-cache' not in request.headers.get('Cache-Control', '')
+
+
+def complete_prompt(persona, user_message, use_cache=True):
+    """Run the persona prompt through the response cache and OpenAI.
+
+    Returns (ai_text, cached). Errors from the OpenAI client propagate.
+    """
+    # Build the system prompt with persona details
+    with metrics.timer('persona_prompt_phase_seconds', phase='prompt_build'):
+        system_prompt = build_system_prompt(persona)
+
+        # Prepare messages for OpenAI chat endpoint
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+        cache_key = ResponseCache.make_key(LLM_MODEL, system_prompt, user_message)
+    logger.debug('system_prompt persona_id=%s prompt=%r', persona.id, system_prompt)
+
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info('prompt_cache_hit persona_id=%s', persona.id)
+            return cached, True
+    else:
+        response_cache.count('bypassed')
+
+    # Call OpenAI Chat Completions using the OpenAI client
+    started = time.perf_counter()
+    try:
+        response, coalesced = upstream.create(
+            model=LLM_MODEL,
+            messages=messages,
+            max_completion_tokens=LLM_MAX_COMPLETION_TOKENS
+        )
+    finally:
+        metrics.observe('persona_prompt_phase_seconds', time.perf_counter() - started, phase='upstream')
+    ai_text = response.choices[0].message.content
+    logger.info('prompt_completed persona_id=%s upstream_ms=%.1f finish_reason=%s',
+                persona.id, (time.perf_counter() - started) * 1000, response.choices[0].finish_reason)
+    logger.debug('ai_response persona_id=%s text=%r', persona.id, ai_text)
+
+    # A coalesced follower's leader is already storing the same text
+    if ai_text and not coalesced:
+        response_cache.try_set(cache_key, persona.id, ai_text)
+    return ai_text, False
+
+
+class PromptJob(db.Model):
+    __tablename__ = 'prompt_jobs'
+    id = Column(String(32), primary_key=True)
+    persona_id = Column(Integer, nullable=False, index=True)
+    message = Column(Text, nullable=False)
+    use_cache = Column(Boolean, nullable=False, default=True)
+    status = Column(String(16), nullable=False, index=True)  # queued, running, succeeded, failed
+    result = Column(Text, nullable=True)
+    cached = Column(Boolean, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'persona_id': self.persona_id,
+            'status': self.status,
+            'ai_response': self.result,
+            'cached': self.cached,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobQueue:
+    """Bounded queue of prompt job ids drained by a pool of worker threads.
+
+    Job state lives in the prompt_jobs table; the in-memory queue only holds
+    ids, so anything queued or running when the process died is picked up
+    again by recover(). This assumes a single server process owns the queue.
+    """
+
+    def __init__(self, workers, depth):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=depth)
+        self._finished = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f'prompt-worker-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, job_id):
+        """Enqueue a committed job. Raises queue.Full when the queue is at capacity."""
+        self._queue.put_nowait(job_id)
+
+    def recover(self):
+        """Reset jobs left running by a previous process and return the ids to re-enqueue.
+
+        Must run before start() and before requests are served, so no worker
+        can have claimed a job yet and no new submission is picked up twice.
+        """
+        PromptJob.query.filter_by(status='running').update({'status': 'queued', 'started_at': None})
+        db.session.commit()
+        job_ids = [job_id for (job_id,) in db.session.query(PromptJob.id)
+                   .filter_by(status='queued').order_by(PromptJob.created_at)]
+        if job_ids:
+            logger.info('prompt_jobs_recovered count=%d', len(job_ids))
+        return job_ids
+
+    def requeue(self, job_ids):
+        """Enqueue recovered jobs, blocking while the queue is full."""
+        for job_id in job_ids:
+            self._queue.put(job_id)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def wait(self, timeout):
+        """Block until some job finishes or the timeout expires."""
+        with self._finished:
+            self._finished.wait(timeout)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                with app.app_context():
+                    self._process(job_id)
+            except Exception:
+                logger.exception('prompt_job_crashed job_id=%s', job_id)
+                self._mark_failed(job_id, 'internal error')
+            finally:
+                self._queue.task_done()
+                with self._finished:
+                    self._finished.notify_all()
+
+    def _process(self, job_id):
+        # Claim the job atomically so a job enqueued twice (e.g. by recover()) runs once
+        claimed = PromptJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'started_at': time.time()})
+        db.session.commit()
+        if not claimed:
+            return
+        job = db.session.get(PromptJob, job_id)
+
+        persona = db.session.get(Persona, job.persona_id)
+        if persona is None:
+            job.status = 'failed'
+            job.error = 'persona not found'
+        else:
+            try:
+                job.result, job.cached = complete_prompt(persona, job.message, job.use_cache)
+                job.status = 'succeeded'
+            except Exception as e:
+                logger.warning('openai_error job_id=%s error=%r', job_id, str(e))
+                db.session.rollback()
+                job = db.session.get(PromptJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+        job.finished_at = time.time()
+        db.session.commit()
+
+    def _mark_failed(self, job_id, error):
+        """Fail a claimed job in a fresh session so it is not left running."""
+        try:
+            with app.app_context():
+                PromptJob.query.filter_by(id=job_id, status='running').update(
+                    {'status': 'failed', 'error': error, 'finished_at': time.time()})
+                db.session.commit()
+        except Exception:
+            logger.exception('prompt_job_mark_failed_error job_id=%s', job_id)
+
+
+job_queue = JobQueue(app.config['PROMPT_WORKERS'], app.config['PROMPT_QUEUE_DEPTH'])
+
+
+def submit_prompt_job(persona, user_message, use_cache):
+    job = PromptJob(id=uuid.uuid4().hex, persona_id=persona.id, message=user_message,
+                    use_cache=use_cache, status='queued', created_at=time.time())
+    db.session.add(job)
+    db.session.commit()
+    try:
+        job_queue.submit(job.id)
+    except queue.Full:
+        db.session.delete(job)
+        db.session.commit()
+        return jsonify({'error': 'too many pending prompt jobs, retry later'}), 429, {'Retry-After': '5'}
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': f'/jobs/{job.id}'}), 202
+
+
+class Conversation(db.Model):
+    __tablename__ = 'conversations'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    persona_id = Column(Integer, nullable=False, index=True)
+    summary = Column(Text, nullable=True)
+    # Messages before this id are no longer sent; they are folded into summary
+    window_start_id = Column(Integer, nullable=False, default=0)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'persona_id': self.persona_id,
+            'summary': self.summary,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+class ConversationMessage(db.Model):
+    __tablename__ = 'conversation_messages'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(Integer, nullable=False, index=True)
+    role = Column(String(16), nullable=False)  # user or assistant
+    content = Column(Text, nullable=False)
+    tokens = Column(Integer, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'role': self.role,
+            'content': self.content,
+            'tokens': self.tokens,
+            'created_at': self.created_at
+        }
+
+
+def summarize_history(previous_summary, messages):
+    """Fold messages that left the history window into the running summary."""
+    transcript = '\n'.join(f"{m.role}: {m.content}" for m in messages)
+    prompt = ("Summarize this sales conversation between a user and a buyer persona in a few sentences. "
+              "Keep product details, objections and any commitments.")
+    if previous_summary:
+        prompt += f"\n\nSummary so far:\n{previous_summary}"
+    with metrics.timer('persona_prompt_phase_seconds', phase='summarize'):
+        response, _ = upstream.create(
+            model=LLM_MODEL,
+            messages=[{"role": "system", "content": prompt}, {"role": "user", "content": transcript}],
+            max_completion_tokens=app.config['CONVERSATION_SUMMARY_MAX_TOKENS']
+        )
+    return response.choices[0].message.content
+
+
+def conversation_history(conversation, new_tokens):
+    """Return the stored messages to send with the next turn, within the token budget.
+
+    The window only moves forward in steps: once the history plus the new
+    message exceeds the budget, the oldest messages are dropped until the
+    rest fits in half of it. Between steps every turn re-sends the exact
+    same prefix, which keeps provider-side prompt caching effective. Dropped
+    messages are summarized when CONVERSATION_SUMMARIZE is on. The caller
+    commits the session.
+    """
+    budget = app.config['CONVERSATION_HISTORY_TOKEN_BUDGET']
+    with metrics.timer('persona_prompt_phase_seconds', phase='db_lookup'):
+        history = (ConversationMessage.query
+                   .filter(ConversationMessage.conversation_id == conversation.id,
+                           ConversationMessage.id >= conversation.window_start_id)
+                   .order_by(ConversationMessage.id).all())
+    total = sum(m.tokens for m in history) + new_tokens
+    if total <= budget:
+        return history
+
+    dropped = []
+    while history and total > budget // 2:
+        message = history.pop(0)
+        dropped.append(message)
+        total -= message.tokens
+    # Always drop whole user/assistant exchanges
+    if history and history[0].role == 'assistant':
+        dropped.append(history.pop(0))
+    if not dropped:
+        return history
+
+    conversation.window_start_id = history[0].id if history else dropped[-1].id + 1
+    if dropped and app.config['CONVERSATION_SUMMARIZE']:
+        try:
+            conversation.summary = summarize_history(conversation.summary, dropped)
+        except Exception as e:
+            logger.warning('conversation_summary_failed conversation_id=%s error=%r', conversation.id, str(e))
+    logger.info('conversation_window_advanced conversation_id=%s dropped=%d kept=%d',
+                conversation.id, len(dropped), len(history))
+    return history
+
+
+# Full-text index over the persona text columns. personas_fts is an FTS5
+# external-content table kept in sync by triggers, so every write path
+# (ORM, bulk insert, delete) updates it in the same transaction.
+PERSONA_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_personas_annual_income ON personas (annual_income)",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS personas_fts USING fts5(
+        name, location, extras, content='personas', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS personas_fts_ai AFTER INSERT ON personas BEGIN
+        INSERT INTO personas_fts(rowid, name, location, extras)
+        VALUES (new.id, new.name, new.location, new.extras);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS personas_fts_ad AFTER DELETE ON personas BEGIN
+        INSERT INTO personas_fts(personas_fts, rowid, name, location, extras)
+        VALUES ('delete', old.id, old.name, old.location, old.extras);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS personas_fts_au AFTER UPDATE ON personas BEGIN
+        INSERT INTO personas_fts(personas_fts, rowid, name, location, extras)
+        VALUES ('delete', old.id, old.name, old.location, old.extras);
+        INSERT INTO personas_fts(rowid, name, location, extras)
+        VALUES (new.id, new.name, new.location, new.extras);
+    END""",
+]
+
+
+def ensure_search_index():
+    """Create the search index and triggers, backfilling existing rows on first run."""
+    conn = db.session.connection()
+    exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'personas_fts'").first()
+    for statement in PERSONA_SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+    if not exists:
+        conn.exec_driver_sql("INSERT INTO personas_fts(personas_fts) VALUES ('rebuild')")
+    db.session.commit()
+
+
+def fts_query(q):
+    """Turn free text into an FTS5 query: every term must match, as a prefix."""
+    terms = ['"' + term.replace('"', '""') + '"*' for term in q.split()]
+    return ' AND '.join(terms)
+
+
 # Ensure DB and tables exist
 with app.app_context():
     db.create_all()
+    if db.session.get(TableVersion, 'personas') is None:
+        db.session.add(TableVersion(name='personas', version=0))
+        db.session.commit()
+    ensure_search_index()
+    response_cache.purge_expired()
+    recovered_job_ids = job_queue.recover()
+
+job_queue.start()
+threading.Thread(target=job_queue.requeue, args=(recovered_job_ids,), name='prompt-job-recovery',
+                 daemon=True).start()
+
+
+# --- Request timing ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_timing(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        elapsed = time.perf_counter() - started
+        metrics.observe('http_request_duration_seconds', elapsed,
+                        method=request.method, route=route, status=response.status_code)
+        logger.info('request method=%s route=%s status=%s duration_ms=%.1f',
+                    request.method, route, response.status_code, elapsed * 1000)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of request, prompt phase, token, cache and job queue metrics."""
+    lines = [metrics.render().rstrip('\n')]
+    cache = response_cache.snapshot()
+    lines.append('# HELP prompt_cache_events_total Response cache lookups and invalidations by event.')
+    lines.append('# TYPE prompt_cache_events_total counter')
+    for event in ('memory_hits', 'db_hits', 'misses', 'bypassed', 'invalidations'):
+        lines.append(Metrics.format_sample('prompt_cache_events_total', (('event', event),), cache[event]))
+    lines.append('# HELP prompt_cache_memory_entries Entries in the in-process cache tier.')
+    lines.append('# TYPE prompt_cache_memory_entries gauge')
+    lines.append(Metrics.format_sample('prompt_cache_memory_entries', (), cache['memory_entries']))
+    lines.append('# HELP upstream_concurrency_limit Current adaptive limit on concurrent OpenAI calls.')
+    lines.append('# TYPE upstream_concurrency_limit gauge')
+    lines.append(Metrics.format_sample('upstream_concurrency_limit', (), round(upstream.limiter.limit, 2)))
+    lines.append('# HELP upstream_in_flight OpenAI calls currently in flight.')
+    lines.append('# TYPE upstream_in_flight gauge')
+    lines.append(Metrics.format_sample('upstream_in_flight', (), upstream.limiter.in_flight))
+    lines.append('# HELP prompt_job_queue_depth Prompt jobs waiting for a worker.')
+    lines.append('# TYPE prompt_job_queue_depth gauge')
+    lines.append(Metrics.format_sample('prompt_job_queue_depth', (), job_queue.depth()))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 
 # --- Web UI Route ---
@@ -57,37 +1046,300 @@ def index():
 
 # --- CRUD endpoints ---
 
-@app.route('/personas', methods=['POST'])
-def create_persona():
-    data = request.get_json() or {}
+def parse_number(value, field):
+    """Coerce an optional numeric field, raising ValueError with a client-facing message."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be a number')
+
+
+def check_string(value, field):
+    """Raise ValueError with a client-facing message unless value is a string or None."""
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    return value
+
+
+def validate_persona_data(data):
+    """Apply the create_persona rules to one record.
+
+    Returns the column values for a new Persona, or raises ValueError with
+    a client-facing message.
+    """
     name = data.get('name')
     if not name:
-        return jsonify({'error': 'name is required'}), 400
+        raise ValueError('name is required')
 
-    location = data.get('location')
-    annual_income = data.get('annual_income')
-    extras = data.get('extras')
+    return {
+        'name': check_string(name, 'name'),
+        'location': check_string(data.get('location'), 'location'),
+        'annual_income': parse_number(data.get('annual_income'), 'annual_income'),
+        'extras': check_string(data.get('extras'), 'extras')
+    }
 
+
+@app.route('/personas', methods=['POST'])
+def create_persona():
+    data = request.get_json() or {}
     try:
-        if annual_income is not None:
-            try:
-                annual_income = float(annual_income)
-            except ValueError:
-                return jsonify({'error': 'annual_income must be a number'}), 400
+        values = validate_persona_data(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        persona = Persona(name=name, location=location, annual_income=annual_income, extras=extras)
+    try:
+        persona = Persona(**values)
         db.session.add(persona)
+        bump_table_version('personas')
         db.session.commit()
         return jsonify(persona.to_dict()), 201
-    except IntegrityError:
+    except SQLAlchemyError:
         db.session.rollback()
         return jsonify({'error': 'database error'}), 500
 
 
+def iter_bulk_records(stream, fmt):
+    """Yield (line_number, record) pairs from an NDJSON or CSV body without reading it all.
+
+    Records that cannot be parsed are yielded as (line_number, ValueError).
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Empty CSV cells mean "not set", like a missing JSON key
+            yield reader.line_num, {k: v for k, v in row.items() if k and v not in ('', None)}
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f'invalid JSON: {e.msg}')
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError('each line must be a JSON object')
+            continue
+        yield line_number, record
+
+
+@app.route('/personas/bulk', methods=['POST'])
+def bulk_import_personas():
+    """POST /personas/bulk?format=ndjson|csv&batch_size=1000
+
+    Imports a streamed NDJSON body (one persona object per line) or a CSV
+    body with a name,location,annual_income,extras header. The format
+    defaults from the Content-Type. Rows are validated like POST /personas
+    and valid ones are inserted in batches, one transaction per batch.
+    Invalid rows are reported and skipped; they never abort the import.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    batch_size = request.args.get('batch_size', app.config['BULK_IMPORT_BATCH_SIZE'], type=int)
+    if batch_size is None or batch_size < 1:
+        return jsonify({'error': 'batch_size must be a positive integer'}), 400
+
+    max_errors = app.config['BULK_IMPORT_MAX_ERRORS']
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+
+    def record_error(line_number, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < max_errors:
+            errors.append({'line': line_number, 'error': message})
+
+    def insert_rows(rows):
+        db.session.execute(insert(Persona), [values for _, values in rows])
+        bump_table_version('personas')
+        db.session.commit()
+
+    def flush(batch):
+        nonlocal inserted
+        try:
+            insert_rows(batch)
+            inserted += len(batch)
+            return
+        except SQLAlchemyError:
+            db.session.rollback()
+
+        # Retry row by row so only the offending rows fail
+        for row in batch:
+            try:
+                insert_rows([row])
+                inserted += 1
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logger.warning('bulk_import_row_failed line=%s error=%r', row[0], str(e))
+                record_error(row[0], 'database error')
+
+    try:
+        for line_number, record in iter_bulk_records(request.stream, fmt):
+            if isinstance(record, ValueError):
+                record_error(line_number, str(record))
+                continue
+            try:
+                batch.append((line_number, validate_persona_data(record)))
+            except ValueError as e:
+                record_error(line_number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        record_error(None, f'could not read body: {e}')
+    if batch:
+        flush(batch)
+
+    return jsonify({
+        'inserted': inserted,
+        'failed': failed,
+        'errors': errors,
+        'errors_truncated': failed > len(errors)
+    }), 200
+
+
+@app.route('/personas/export', methods=['GET'])
+def export_personas():
+    """GET /personas/export?format=ndjson|csv
+
+    Streams every persona ordered by id. Rows are fetched from the database
+    in EXPORT_FETCH_SIZE chunks instead of loading the whole table.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    fetch_size = app.config['EXPORT_FETCH_SIZE']
+    stmt = (select(*[getattr(Persona, f) for f in PERSONA_FIELDS])
+            .order_by(Persona.id)
+            .execution_options(stream_results=True, yield_per=fetch_size))
+
+    def generate():
+        result = db.session.execute(stmt)
+        try:
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(PERSONA_FIELDS)
+                for rows in result.partitions():
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            else:
+                for rows in result.partitions():
+                    yield ''.join(json.dumps(dict(row._mapping)) + '\n' for row in rows)
+        finally:
+            result.close()
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=personas.{fmt}'})
+
+
 @app.route('/personas', methods=['GET'])
 def list_personas():
-    personas = Persona.query.all()
-    return jsonify([p.to_dict() for p in personas]), 200
+    """GET /personas?limit=50&after=<id>&fields=id,name,location
+
+    - limit/after: keyset pagination on id. When more rows follow, the
+      X-Next-Cursor header holds the value to pass as after= next time.
+      Without limit the whole table is returned, as before.
+    - fields: only these columns are selected (id is always included).
+    - ETag / If-None-Match: the tag follows the personas table version, so
+      repeat polls of an unchanged table get a 304 without touching rows.
+    """
+    fields = PERSONA_FIELDS
+    if request.args.get('fields'):
+        fields = ['id'] + [f for f in request.args['fields'].split(',') if f != 'id']
+        unknown = [f for f in fields if f not in PERSONA_FIELDS]
+        if unknown:
+            return jsonify({'error': f"unknown fields: {', '.join(unknown)}"}), 400
+
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after', type=int)
+    if limit is None and 'limit' in request.args or after is None and 'after' in request.args:
+        return jsonify({'error': 'limit and after must be integers'}), 400
+    if limit is not None:
+        limit = max(1, min(limit, app.config['PERSONA_PAGE_MAX_LIMIT']))
+
+    query_key = f"{','.join(fields)}|{limit}|{after}"
+    etag = hashlib.sha1(f"{get_table_version('personas')}|{query_key}".encode('utf-8')).hexdigest()
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+    query = db.session.query(*[getattr(Persona, f) for f in fields]).order_by(Persona.id)
+    if after is not None:
+        query = query.filter(Persona.id > after)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = [dict(row._mapping) for row in query]
+
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers['X-Next-Cursor'] = str(rows[-1]['id'])
+    return jsonify(rows), 200, headers
+
+
+@app.route('/personas/search', methods=['GET'])
+def search_personas():
+    """GET /personas/search?q=berlin automation&min_income=1e5&max_income=1e6&limit=20&offset=0
+
+    - q: full-text match over name, location and extras (all terms, prefix
+      match), ranked by bm25 with name weighted above location above extras
+    - min_income/max_income: range filter served by the annual_income index
+    Without q the matches are ordered by id. Returns {"results": [...],
+    "next_offset": n} where next_offset is null on the last page.
+    """
+    q = (request.args.get('q') or '').strip()
+    try:
+        min_income = parse_number(request.args.get('min_income'), 'min_income')
+        max_income = parse_number(request.args.get('max_income'), 'max_income')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = request.args.get('limit', 20, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if limit is None or offset is None or limit < 1 or offset < 0:
+        return jsonify({'error': 'limit and offset must be non-negative integers'}), 400
+    limit = min(limit, app.config['PERSONA_PAGE_MAX_LIMIT'])
+
+    conditions = []
+    params = {'limit': limit + 1, 'offset': offset}
+    if min_income is not None:
+        conditions.append('p.annual_income >= :min_income')
+        params['min_income'] = min_income
+    if max_income is not None:
+        conditions.append('p.annual_income <= :max_income')
+        params['max_income'] = max_income
+
+    columns = ', '.join(f'p.{f}' for f in PERSONA_FIELDS)
+    if q:
+        conditions.insert(0, 'personas_fts MATCH :q')
+        params['q'] = fts_query(q)
+        sql = (f"SELECT {columns}, -bm25(personas_fts, 10.0, 5.0, 1.0) AS score "
+               "FROM personas_fts JOIN personas p ON p.id = personas_fts.rowid "
+               f"WHERE {' AND '.join(conditions)} ORDER BY score DESC, p.id")
+    else:
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+        sql = f"SELECT {columns}, NULL AS score FROM personas p {where}ORDER BY p.id"
+
+    rows = db.session.execute(text(sql + ' LIMIT :limit OFFSET :offset'), params).mappings().all()
+    next_offset = offset + limit if len(rows) > limit else None
+    return jsonify({'results': [dict(row) for row in rows[:limit]], 'next_offset': next_offset}), 200
 
 
 @app.route('/personas/<int:persona_id>', methods=['GET'])
@@ -105,23 +1357,26 @@ def update_persona(persona_id):
         return jsonify({'error': 'not found'}), 404
 
     data = request.get_json() or {}
-    name = data.get('name')
+    # Same field rules as create_persona
+    try:
+        name = check_string(data.get('name'), 'name')
+        location = check_string(data.get('location'), 'location')
+        annual_income = parse_number(data.get('annual_income'), 'annual_income')
+        extras = check_string(data.get('extras'), 'extras')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     if name is not None:
         p.name = name
     if 'location' in data:
-        p.location = data.get('location')
+        p.location = location
     if 'annual_income' in data:
-        ai = data.get('annual_income')
-        if ai is not None:
-            try:
-                p.annual_income = float(ai)
-            except ValueError:
-                return jsonify({'error': 'annual_income must be a number'}), 400
-        else:
-            p.annual_income = None
+        p.annual_income = annual_income
     if 'extras' in data:
-        p.extras = data.get('extras')
+        p.extras = extras
 
+    response_cache.invalidate_persona(p.id)
+    bump_table_version('personas')
     db.session.commit()
     return jsonify(p.to_dict()), 200
 
@@ -131,7 +1386,12 @@ def delete_persona(persona_id):
     p = Persona.query.get(persona_id)
     if not p:
         return jsonify({'error': 'not found'}), 404
+    response_cache.invalidate_persona(p.id)
+    conversation_ids = db.session.query(Conversation.id).filter_by(persona_id=p.id)
+    ConversationMessage.query.filter(ConversationMessage.conversation_id.in_(conversation_ids.scalar_subquery())).delete()
+    Conversation.query.filter_by(persona_id=p.id).delete()
     db.session.delete(p)
+    bump_table_version('personas')
     db.session.commit()
     return jsonify({'message': 'deleted'}), 200
 
@@ -140,84 +1400,372 @@ def delete_persona(persona_id):
 @app.route('/personas/<int:persona_id>/prompt', methods=['POST'])
 def persona_prompt(persona_id):
     """POST /personas/<id>/prompt
-    Body JSON: {"message": "..."}
+    Body JSON: {"message": "...", "cache": true}
+    Query: ?async=1 to run the prompt as a background job
 
         The endpoint:
         - looks up the persona by id
         - builds a chat message that contains the persona details and the user's message
         - calls the OpenAI Chat Completions endpoint (expects OPENAI_API_KEY in env)
         - returns the AI's reply as JSON
+
+    Replies are served from the response cache when the same persona got the
+    same message before. Send "cache": false (or Cache-Control: no-cache) to
+    force a fresh completion.
+
+    With ?async=1 the endpoint returns 202 and a job id right away; poll
+    GET /jobs/<id> for the result. 429 means the job queue is full.
 """
     data = request.get_json() or {}
     user_message = data.get('message')
 
-    print(user_message)
+    logger.debug('user_message persona_id=%s message=%r', persona_id, user_message)
 
     if not user_message:
         return jsonify({'error': 'message field is required in the request body'}), 400
 
-    persona = db.session.query(Persona).filter_by(id=persona_id).first()
+    with metrics.timer('persona_prompt_phase_seconds', phase='db_lookup'):
+        persona = db.session.query(Persona).filter_by(id=persona_id).first()
     if not persona:
         return jsonify({'error': 'persona not found'}), 404
 
-    # Build the system prompt with persona details
-    persona_texts = [f"Name: {persona.name}"]
-    if persona.location:
-        persona_texts.append(f"Location: {persona.location}")
-    if persona.annual_income is not None:
-        persona_texts.append(f"Annual Income: {persona.annual_income}")
-    if persona.extras:
-        persona_texts.append(f"Extras: {persona.extras}")
+    if request.args.get('async') in ('1', 'true'):
+        return submit_prompt_job(persona, user_message, cache_requested(data))
 
-    system_prompt = f"""You are an AI assistant with extensive business consultancy experience.
-Your role is to help identify the ideal customer types most likely to purchase my products.
-Create five detailed buyer personas and recommend them to me.
+    try:
+        ai_text, cached = complete_prompt(persona, user_message, cache_requested(data))
+    except Exception as e:
+        logger.warning('openai_error persona_id=%s error=%r', persona_id, str(e))
+        return jsonify({'error': 'failed to reach OpenAI API', 'details': str(e)}), 502
 
-For each persona you embody:
+    return jsonify({'ai_response': ai_text, 'cached': cached}), 200
 
-Respond realistically and conversationally.
 
-Do not automatically show interest in every product.
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-Only express interest or willingness to buy if the product genuinely fits the persona’s needs, goals, and context.
 
-If the product does not align with the persona, explain why—naturally and in character.
+@app.route('/personas/<int:persona_id>/prompt/stream', methods=['POST'])
+def persona_prompt_stream(persona_id):
+    """POST /personas/<id>/prompt/stream
+    Body JSON: {"message": "...", "cache": true}
 
-After creating the personas, you will adopt the one I select and respond strictly from that persona’s point of view.
+    Same as /personas/<id>/prompt but answers with Server-Sent Events:
+        - "delta" events carry {"content": "..."} as tokens arrive
+        - a final "done" event carries usage, time to first token and total time
+        - "error" is sent instead of "done" if the upstream call fails
 
-Below is the information for the company you will assist with the ideal personas 
-{persona_texts}
+    If the client disconnects the upstream stream is closed so we stop
+    paying for tokens nobody reads.
+    """
+    data = request.get_json() or {}
+    user_message = data.get('message')
+    if not user_message:
+        return jsonify({'error': 'message field is required in the request body'}), 400
 
-Respond should be a text with the following format: 
-Short description of the company as a persona with address, annual Annual turnover and number of employees. 
-Relevant Contact Person in the company and their department 
-How to approach them 
+    with metrics.timer('persona_prompt_phase_seconds', phase='db_lookup'):
+        persona = db.session.query(Persona).filter_by(id=persona_id).first()
+    if not persona:
+        return jsonify({'error': 'persona not found'}), 404
 
-"""
-    print(system_prompt)
+    with metrics.timer('persona_prompt_phase_seconds', phase='prompt_build'):
+        system_prompt = build_system_prompt(persona)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
 
-    # Prepare messages for OpenAI chat endpoint
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_message}
-    ]
+    use_cache = cache_requested(data)
+    cache_key = ResponseCache.make_key(LLM_MODEL, system_prompt, user_message)
+    cached = response_cache.get(cache_key) if use_cache else None
+    if not use_cache:
+        response_cache.count('bypassed')
+    persona_id = persona.id
 
-    # Call OpenAI Chat Completions using the OpenAI client
+    def generate():
+        started = time.perf_counter()
+        if cached is not None:
+            yield sse_event('delta', {'content': cached})
+            yield sse_event('done', {'cached': True, 'usage': None, 'ttft_ms': 0.0,
+                                     'total_ms': round((time.perf_counter() - started) * 1000, 1)})
+            return
+
+        request_kwargs = {
+            'model': LLM_MODEL,
+            'messages': messages,
+            'max_completion_tokens': LLM_MAX_COMPLETION_TOKENS,
+            'stream': True,
+            'stream_options': {'include_usage': True}
+        }
+        try:
+            stream, _ = upstream.create(**request_kwargs)
+        except Exception as e:
+            logger.warning('openai_error persona_id=%s error=%r', persona_id, str(e))
+            metrics.inc('openai_requests_total', outcome='error')
+            yield sse_event('error', {'error': 'failed to reach OpenAI API', 'details': str(e)})
+            return
+
+        parts = []
+        usage = None
+        ttft_ms = None
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage.model_dump()
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    parts.append(content)
+                    yield sse_event('delta', {'content': content})
+        except Exception as e:
+            logger.warning('openai_stream_error persona_id=%s error=%r', persona_id, str(e))
+            metrics.inc('openai_requests_total', outcome='error')
+            yield sse_event('error', {'error': 'OpenAI stream failed', 'details': str(e)})
+            return
+        finally:
+            # Also runs on GeneratorExit when the browser disconnects
+            stream.close()
+            metrics.observe('persona_prompt_phase_seconds', time.perf_counter() - started, phase='upstream')
+
+        metrics.inc('openai_requests_total', outcome='ok')
+        record_usage(usage)
+        upstream.refund(request_kwargs, usage)
+        ai_text = ''.join(parts)
+        if ai_text:
+            response_cache.try_set(cache_key, persona_id, ai_text)
+        yield sse_event('done', {'cached': False, 'usage': usage, 'ttft_ms': ttft_ms,
+                                 'total_ms': round((time.perf_counter() - started) * 1000, 1)})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input matches literally (use with escape='\\')."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+@app.route('/personas/prompt-batch', methods=['POST'])
+def persona_prompt_batch():
+    """POST /personas/prompt-batch
+    Body JSON: {"message": "...", "persona_ids": [1, 2, 3], "concurrency": 4, "cache": true}
+           or: {"message": "...", "filter": {"location": "Berlin", "min_income": 0, "max_income": 1e6}}
+
+    Sends the same message to every selected persona concurrently and
+    streams one NDJSON line per persona as soon as its completion finishes:
+        {"persona_id": 1, "ok": true, "ai_response": "...", "cached": false, "latency_ms": 812.3}
+        {"persona_id": 2, "ok": false, "error": "...", "latency_ms": 30.1}
+    followed by a summary line {"done": true, "total": ..., "succeeded": ..., "failed": ..., "elapsed_ms": ...}.
+    """
+    data = request.get_json() or {}
+    user_message = data.get('message')
+    if not user_message:
+        return jsonify({'error': 'message field is required in the request body'}), 400
+
+    persona_ids = data.get('persona_ids')
+    filters = data.get('filter')
+    if persona_ids is None and filters is None:
+        return jsonify({'error': 'persona_ids or filter is required'}), 400
+
+    query = Persona.query
+    if persona_ids is not None:
+        if not isinstance(persona_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool)
+                                                        for i in persona_ids):
+            return jsonify({'error': 'persona_ids must be a list of integers'}), 400
+        query = query.filter(Persona.id.in_(persona_ids))
+    if filters is not None:
+        if not isinstance(filters, dict):
+            return jsonify({'error': 'filter must be an object'}), 400
+        try:
+            min_income = parse_number(filters.get('min_income'), 'min_income')
+            max_income = parse_number(filters.get('max_income'), 'max_income')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if filters.get('location'):
+            if not isinstance(filters['location'], str):
+                return jsonify({'error': 'location must be a string'}), 400
+            query = query.filter(Persona.location.ilike(f"%{escape_like(filters['location'])}%", escape='\\'))
+        if min_income is not None:
+            query = query.filter(Persona.annual_income >= min_income)
+        if max_income is not None:
+            query = query.filter(Persona.annual_income <= max_income)
+
+    try:
+        concurrency = int(data.get('concurrency', app.config['BATCH_DEFAULT_CONCURRENCY']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be an integer'}), 400
+    concurrency = max(1, min(concurrency, app.config['BATCH_MAX_CONCURRENCY']))
+
+    # One query for all personas, detached so worker threads can read them
+    max_personas = app.config['BATCH_MAX_PERSONAS']
+    personas = query.order_by(Persona.id).limit(max_personas + 1).all()
+    if len(personas) > max_personas:
+        return jsonify({'error': f'batch is limited to {max_personas} personas'}), 400
+    db.session.expunge_all()
+    missing = sorted(set(persona_ids or []) - {p.id for p in personas})
+    use_cache = cache_requested(data)
+
+    def run_one(persona):
+        started = time.perf_counter()
+        with app.app_context():
+            try:
+                ai_text, cached = complete_prompt(persona, user_message, use_cache)
+                result = {'persona_id': persona.id, 'ok': True, 'ai_response': ai_text, 'cached': cached}
+            except Exception as e:
+                logger.warning('openai_error persona_id=%s error=%r', persona.id, str(e))
+                result = {'persona_id': persona.id, 'ok': False, 'error': str(e)}
+        result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def generate():
+        started = time.perf_counter()
+        succeeded = 0
+        for persona_id in missing:
+            yield json.dumps({'persona_id': persona_id, 'ok': False, 'error': 'persona not found', 'latency_ms': 0.0}) + '\n'
+
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='prompt-batch')
+        try:
+            futures = [executor.submit(run_one, p) for p in personas]
+            for future in as_completed(futures):
+                result = future.result()
+                succeeded += result['ok']
+                yield json.dumps(result) + '\n'
+        finally:
+            # Also runs when the client disconnects: drop personas not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        total = len(personas) + len(missing)
+        yield json.dumps({'done': True, 'total': total, 'succeeded': succeeded, 'failed': total - succeeded,
+                          'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
+# --- Conversations ---
+
+@app.route('/personas/<int:persona_id>/conversations', methods=['POST'])
+def create_conversation(persona_id):
+    persona = db.session.get(Persona, persona_id)
+    if not persona:
+        return jsonify({'error': 'persona not found'}), 404
+    now = time.time()
+    conversation = Conversation(persona_id=persona.id, window_start_id=0, created_at=now, updated_at=now)
+    db.session.add(conversation)
+    db.session.commit()
+    return jsonify(conversation.to_dict()), 201
+
+
+@app.route('/personas/<int:persona_id>/conversations/<int:conversation_id>', methods=['GET'])
+def get_conversation(persona_id, conversation_id):
+    conversation = Conversation.query.filter_by(id=conversation_id, persona_id=persona_id).first()
+    if not conversation:
+        return jsonify({'error': 'not found'}), 404
+    messages = ConversationMessage.query.filter_by(conversation_id=conversation.id).order_by(ConversationMessage.id)
+    return jsonify(dict(conversation.to_dict(), messages=[m.to_dict() for m in messages])), 200
+
+
+@app.route('/personas/<int:persona_id>/conversations/<int:conversation_id>/messages', methods=['POST'])
+def post_conversation_message(persona_id, conversation_id):
+    """POST /personas/<id>/conversations/<cid>/messages
+    Body JSON: {"message": "..."}
+
+    Sends the next turn of a conversation. The request to OpenAI is the
+    persona system prompt, the running summary (if any), the stored history
+    within CONVERSATION_HISTORY_TOKEN_BUDGET and the new message, so
+    clients only send the new message instead of re-pasting the exchange.
+    """
+    data = request.get_json() or {}
+    user_message = data.get('message')
+    if not user_message:
+        return jsonify({'error': 'message field is required in the request body'}), 400
+
+    with metrics.timer('persona_prompt_phase_seconds', phase='db_lookup'):
+        persona = db.session.get(Persona, persona_id)
+        conversation = Conversation.query.filter_by(id=conversation_id, persona_id=persona_id).first()
+    if not persona or not conversation:
+        return jsonify({'error': 'not found'}), 404
+
+    user_tokens = estimate_tokens(user_message)
+    # Times its own history query (db_lookup) and any summary call (summarize)
+    history = conversation_history(conversation, user_tokens)
+    with metrics.timer('persona_prompt_phase_seconds', phase='prompt_build'):
+        messages = [{"role": "system", "content": build_system_prompt(persona)}]
+        if conversation.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{conversation.summary}"})
+        messages.extend({"role": m.role, "content": m.content} for m in history)
+        messages.append({"role": "user", "content": user_message})
+
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
-            model='gpt-5-mini',
+        response, _ = upstream.create(
+            model=LLM_MODEL,
             messages=messages,
-            max_completion_tokens=2000  # Increased to allow for reasoning + response
+            max_completion_tokens=LLM_MAX_COMPLETION_TOKENS,
+            prompt_cache_key=f'persona-{persona.id}'
         )
-        print(f"Full response object: {response}")
-        print(f"Response choices: {response.choices}")
-        ai_text = response.choices[0].message.content
-        print(f"AI text content: {ai_text}")
     except Exception as e:
-        print(f"OpenAI API Error: {str(e)}")
+        logger.warning('openai_error persona_id=%s conversation_id=%s error=%r', persona.id, conversation.id, str(e))
+        # Keep a window advance (and its summary) even if the turn itself failed
+        db.session.commit()
         return jsonify({'error': 'failed to reach OpenAI API', 'details': str(e)}), 502
+    finally:
+        metrics.observe('persona_prompt_phase_seconds', time.perf_counter() - started, phase='upstream')
+    ai_text = response.choices[0].message.content or ''
+
+    now = time.time()
+    db.session.add(ConversationMessage(conversation_id=conversation.id, role='user', content=user_message,
+                                       tokens=user_tokens, created_at=now))
+    db.session.add(ConversationMessage(conversation_id=conversation.id, role='assistant', content=ai_text,
+                                       tokens=estimate_tokens(ai_text), created_at=now))
+    conversation.updated_at = now
+    db.session.commit()
+
+    return jsonify({
+        'ai_response': ai_text,
+        'conversation_id': conversation.id,
+        'history_messages': len(history),
+        'history_tokens': sum(m.tokens for m in history),
+        'usage': response.usage.model_dump() if response.usage else None
+    }), 200
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """GET /jobs/<id>?wait=<seconds>
+
+    Returns the job state. With wait > 0 the request long-polls until the
+    job has finished or the wait (capped at JOB_MAX_WAIT_SECONDS) runs out.
+    """
+    job = db.session.get(PromptJob, job_id)
+    if not job:
+        return jsonify({'error': 'not found'}), 404
+
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({'error': 'wait must be a number'}), 400
+    if not math.isfinite(wait):
+        return jsonify({'error': 'wait must be a finite number'}), 400
+    wait = max(0.0, min(wait, app.config['JOB_MAX_WAIT_SECONDS']))
+
+    deadline = time.monotonic() + wait
+    while job.status in ('queued', 'running'):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        job_queue.wait(min(remaining, 1.0))
+        db.session.refresh(job)
+
+    return jsonify(job.to_dict()), 200
+
 
-    return jsonify({'ai_response': ai_text}), 200
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.snapshot()), 200
 
 
 if __name__ == '__main__':
@@ -0,0 +1,126 @@
+"""Compare direct OpenAI calls with the upstream scheduler against a rate-limited stub.
+
+Starts fake_openai.py with an RPM limit and a cap on concurrent requests
+(both answered with 429 + Retry-After), then fires the same burst of
+requests, a share of them duplicates, through:
+
+    direct      OpenAI().chat.completions.create with the SDK's default
+                retries (the old behaviour)
+    scheduler   app.upstream, built from the app's UPSTREAM_* config: token
+                buckets, Retry-After aware backoff, coalescing and adaptive
+                concurrency. UPSTREAM_REQUESTS_PER_MINUTE defaults to the
+                stub's limit, as it would be set to the account's.
+
+Before that it feeds the adaptive limiter 500 healthy calls with latency
+spread uniformly over 1-10s and fails if the concurrency limit drops.
+
+Usage: python bench_scheduler.py [--requests 200] [--clients 32] [--rpm-limit 600]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from fake_openai import start_fake_openai
+
+
+def run(label, create, requests, clients, duplicate_share, server):
+    rng = random.Random(1)
+    messages = [f'Pitch {i}' if rng.random() >= duplicate_share else 'Pitch 0' for i in range(requests)]
+    served_before = server.requests_served
+    rejected_before = server.requests_rejected
+    results = {'ok': 0, 'failed': 0}
+    latencies = []
+    lock = threading.Lock()
+    pending = list(enumerate(messages))
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                _, message = pending.pop()
+            started = time.perf_counter()
+            try:
+                create(model='gpt-5-mini', messages=[{'role': 'user', 'content': message}],
+                       max_completion_tokens=200)
+                outcome = 'ok'
+            except Exception:
+                outcome = 'failed'
+            with lock:
+                results[outcome] += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{label:<10} {results['ok']:>5} {results['failed']:>7} {server.requests_served - served_before:>9} "
+          f"{server.requests_rejected - rejected_before:>6} {wall:>8.1f} {results['ok'] / wall:>8.1f} "
+          f"{statistics.median(latencies):>8.0f} {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:>8.0f}")
+
+
+def check_limiter(app_module, calls=500):
+    """Healthy but variable latency must not lower the concurrency limit."""
+    rng = random.Random(1)
+    limiter = app_module.AdaptiveLimiter(8, 1, 32)
+    lowest = limiter.limit
+    for _ in range(calls):
+        limiter.acquire()
+        limiter.release(latency=rng.uniform(1, 10))
+        lowest = min(lowest, limiter.limit)
+    print(f'limiter, {calls} healthy calls at 1-10s latency: started 8, lowest {lowest:.1f}, '
+          f'ended {limiter.limit:.1f}')
+    if lowest < 8:
+        raise SystemExit('adaptive limiter shrank on healthy latency')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent callers')
+    parser.add_argument('--rpm-limit', type=int, default=600, help='stub requests/minute limit')
+    parser.add_argument('--max-concurrency', type=int, default=8, help='stub limit on requests in flight')
+    parser.add_argument('--latency', type=float, default=0.3, help='stub latency in seconds')
+    parser.add_argument('--duplicates', type=float, default=0.2, help='share of requests that repeat one message')
+    args = parser.parse_args()
+
+    server = start_fake_openai(latency=args.latency, jitter=args.latency / 5, rpm_limit=args.rpm_limit,
+                               max_concurrency=args.max_concurrency)
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/v1'
+    os.environ['OPENAI_API_KEY'] = 'bench'
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='persona-sched-'), 'bench.db')}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('PROMPT_WORKERS', '0')
+    os.environ.setdefault('UPSTREAM_REQUESTS_PER_MINUTE', str(args.rpm_limit))
+    from openai import OpenAI
+    import app as app_module
+
+    check_limiter(app_module)
+
+    direct = OpenAI()
+    scheduler = app_module.upstream
+
+    print(f'{args.requests} requests from {args.clients} callers, stub: {args.rpm_limit} rpm, '
+          f'{args.max_concurrency} in flight, {args.latency}s latency, {args.duplicates:.0%} duplicates')
+    print(f'direct: {direct.max_retries} SDK retries; scheduler: {scheduler.max_retries} retries, '
+          f"{app_module.app.config['UPSTREAM_REQUESTS_PER_MINUTE']} rpm, concurrency "
+          f'{scheduler.limiter.limit:.0f}-{scheduler.limiter.maximum}')
+    print(f"{'mode':<10} {'ok':>5} {'failed':>7} {'upstream':>9} {'429s':>6} {'wall s':>8} {'ok/s':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    run('direct', direct.chat.completions.create, args.requests, args.clients, args.duplicates, server)
+    time.sleep(2)  # let the stub's rate limit bucket refill between runs
+    run('scheduler', scheduler.create, args.requests, args.clients, args.duplicates, server)
+    print(f'scheduler concurrency limit settled at {scheduler.limiter.limit:.1f}')
+
+
+if __name__ == '__main__':
+    main()
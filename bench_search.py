@@ -0,0 +1,133 @@
+"""Benchmark GET /personas/search against the full-scan alternatives.
+
+Loads a throwaway SQLite database with synthetic personas through
+POST /personas/bulk (so the FTS triggers are exercised too), then times
+the same queries three ways:
+
+    full-list   GET /personas and filter in Python, like the browser used to
+    like-scan   SQL LIKE over name/location/extras without the FTS index
+    search      GET /personas/search (FTS5 + annual_income index)
+
+Usage: python bench_search.py [--rows 100000] [--repeat 20]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS = ['automation', 'logistics', 'healthcare', 'retail', 'fintech', 'agency', 'consulting', 'solar',
+         'bakery', 'software', 'manufacturing', 'education', 'insurance', 'marketing', 'security', 'travel']
+CITIES = ['Berlin', 'Munich', 'Hamburg', 'Johannesburg', 'Cape Town', 'London', 'Paris', 'Madrid', 'Lisbon']
+SYLLABLES = ['ka', 'lo', 'mi', 'ru', 'ten', 'vax', 'zo', 'bri', 'dal', 'fen', 'gor', 'hul', 'jin', 'nop', 'qua', 'sel']
+
+# Brand-like words, each shared by only a few dozen personas, so queries on them are selective
+BRANDS = sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES})
+
+QUERIES = [
+    {'q': 'automation berlin'},
+    {'q': 'fintech', 'min_income': 500000},
+    {'q': BRANDS[17]},
+    {'q': f'{BRANDS[1234]} hamburg'},
+    {'min_income': 4000000, 'max_income': 4100000},
+]
+
+
+def synthetic_personas(rows, seed=42):
+    rng = random.Random(seed)
+    for _ in range(rows):
+        words = rng.sample(WORDS, 4)
+        yield {
+            'name': f'{rng.choice(BRANDS).title()} {words[0].title()} {words[1].title()}',
+            'location': rng.choice(CITIES),
+            'annual_income': round(rng.uniform(10000, 5000000), 2),
+            'extras': f'We do {words[2]} and {words[3]} for mid-sized customers.'
+        }
+
+
+def matches(persona, params):
+    """The filter the browser would have to apply to the full list."""
+    if 'q' in params:
+        haystack = ' '.join(str(persona[f] or '') for f in ('name', 'location', 'extras')).lower()
+        if not all(term in haystack for term in params['q'].lower().split()):
+            return False
+    income = persona['annual_income']
+    if 'min_income' in params and (income is None or income < params['min_income']):
+        return False
+    if 'max_income' in params and (income is None or income > params['max_income']):
+        return False
+    return True
+
+
+def like_scan(app_module, params):
+    Persona = app_module.Persona
+    query = Persona.query
+    for term in params.get('q', '').split():
+        pattern = f'%{term}%'
+        query = query.filter(Persona.name.ilike(pattern) | Persona.location.ilike(pattern)
+                             | Persona.extras.ilike(pattern))
+    if 'min_income' in params:
+        query = query.filter(Persona.annual_income >= params['min_income'])
+    if 'max_income' in params:
+        query = query.filter(Persona.annual_income <= params['max_income'])
+    return [p.to_dict() for p in query.order_by(Persona.id).limit(20)]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='persona-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ.setdefault('OPENAI_API_KEY', 'bench-not-used')
+    os.environ.setdefault('PROMPT_WORKERS', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as app_module
+
+    client = app_module.app.test_client()
+    body = ''.join(json.dumps(p) + '\n' for p in synthetic_personas(args.rows))
+    started = time.perf_counter()
+    result = client.post('/personas/bulk', data=io.BytesIO(body.encode('utf-8')),
+                         content_type='application/x-ndjson').get_json()
+    print(f"Imported {result['inserted']} personas in {time.perf_counter() - started:.1f}s ({db_dir})")
+
+    # like-scan stops at the first 20 matches in id order, so it is only slow for
+    # selective terms; search ranks every match, so it pays more for common ones.
+    print(f"{'query':<52} {'method':<10} {'median ms':>10} {'p95 ms':>10} {'hits':>6}")
+    for params in QUERIES:
+        label = json.dumps(params)
+
+        def full_list():
+            personas = client.get('/personas').get_json()
+            return [p for p in personas if matches(p, params)][:20]
+
+        def like():
+            with app_module.app.app_context():
+                return like_scan(app_module, params)
+
+        def search():
+            return client.get('/personas/search', query_string=dict(params, limit=20)).get_json()['results']
+
+        for name, fn in (('full-list', full_list), ('like-scan', like), ('search', search)):
+            hits = len(fn())
+            median, p95 = timed(fn, max(1, args.repeat // 5) if name == 'full-list' else args.repeat)
+            print(f'{label:<52} {name:<10} {median:>10.1f} {p95:>10.1f} {hits:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Local stand-in for the OpenAI Chat Completions API.
+
+Serves POST /v1/chat/completions (plain and stream=True) with a configurable
+delay, so the app can be load-tested without network access or API spend.
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+It can also behave like a rate-limited account: requests over --rpm-limit,
+over --max-concurrency in flight, or picked at random with --error-rate get
+a 429 with Retry-After, like the real API.
+
+Usage: python fake_openai.py [--port 8001] [--latency 0.5] [--jitter 0.1]
+                             [--rpm-limit 600] [--max-concurrency 8] [--error-rate 0.05]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ('Thanks for reaching out. As the persona you described, I would want to understand how this fits '
+         'our current processes, what it costs per seat and who else in our industry already uses it.')
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+
+        retry_after = self.server.admit()
+        if retry_after is not None:
+            self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests',
+                                           'code': 'rate_limit_exceeded'}},
+                           {'Retry-After': f'{retry_after:.3f}', 'Retry-After-Ms': str(int(retry_after * 1000))})
+            return
+        try:
+            self.reply(payload)
+        finally:
+            self.server.release()
+
+    def reply(self, payload):
+        config = self.server.config
+        time.sleep(max(0.0, config['latency'] + random.uniform(-config['jitter'], config['jitter'])))
+
+        prompt_tokens = sum(len(m.get('content', '').split()) for m in payload.get('messages', []))
+        words = REPLY.split()
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(words),
+                 'total_tokens': prompt_tokens + len(words)}
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:12]}'
+        model = payload.get('model', 'fake-model')
+
+        if payload.get('stream'):
+            self.stream_reply(completion_id, model, words, usage)
+            return
+
+        self.send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': REPLY}, 'finish_reason': 'stop'}],
+            'usage': usage
+        })
+
+    def stream_reply(self, completion_id, model, words, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def chunk(choices, chunk_usage=None):
+            data = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                    'model': model, 'choices': choices, 'usage': chunk_usage}
+            self.wfile.write(f'data: {json.dumps(data)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+
+        per_token = self.server.config['token_latency']
+        for i, word in enumerate(words):
+            content = word if i == 0 else ' ' + word
+            chunk([{'index': 0, 'delta': {'content': content}, 'finish_reason': None}])
+            time.sleep(per_token)
+        chunk([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        chunk([], usage)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeOpenAIHandler)
+        self.config = config
+        self.requests_served = 0
+        self.requests_rejected = 0
+        self.in_flight = 0
+        # Requests/minute as a bucket holding one second of burst, refilled continuously
+        self.rpm_tokens = self.rpm_capacity = max(1.0, (config['rpm_limit'] or 0) / 60)
+        self.rpm_updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def admit(self):
+        """Return None to serve the request, or the Retry-After seconds for a 429."""
+        config = self.config
+        with self.lock:
+            if config['error_rate'] and random.random() < config['error_rate']:
+                self.requests_rejected += 1
+                return 1.0
+            if config['max_concurrency'] and self.in_flight >= config['max_concurrency']:
+                self.requests_rejected += 1
+                return 0.2
+            if config['rpm_limit']:
+                rate = config['rpm_limit'] / 60
+                now = time.monotonic()
+                self.rpm_tokens = min(self.rpm_capacity, self.rpm_tokens + (now - self.rpm_updated) * rate)
+                self.rpm_updated = now
+                if self.rpm_tokens < 1:
+                    self.requests_rejected += 1
+                    return (1 - self.rpm_tokens) / rate
+                self.rpm_tokens -= 1
+            self.in_flight += 1
+            self.requests_served += 1
+            return None
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def start_fake_openai(host='127.0.0.1', port=0, latency=0.5, jitter=0.0, token_latency=0.0,
+                      rpm_limit=None, max_concurrency=None, error_rate=0.0):
+    """Start the fake server on a daemon thread. Port 0 picks a free port; see server.server_port."""
+    server = FakeOpenAIServer((host, port), {
+        'latency': latency, 'jitter': jitter, 'token_latency': token_latency,
+        'rpm_limit': rpm_limit, 'max_concurrency': max_concurrency, 'error_rate': error_rate
+    })
+    threading.Thread(target=server.serve_forever, name='fake-openai', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the reply starts')
+    parser.add_argument('--jitter', type=float, default=0.1, help='+/- seconds added to latency')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='seconds between streamed tokens')
+    parser.add_argument('--rpm-limit', type=int, default=None, help='answer 429 above this many requests/minute')
+    parser.add_argument('--max-concurrency', type=int, default=None, help='answer 429 above this many in flight')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    args = parser.parse_args()
+
+    server = start_fake_openai(args.host, args.port, args.latency, args.jitter, args.token_latency,
+                               args.rpm_limit, args.max_concurrency, args.error_rate)
+    print(f'Fake OpenAI API on http://{args.host}:{server.server_port}/v1 (Ctrl+C to stop)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
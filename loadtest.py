@@ -0,0 +1,146 @@
+"""Offline load test for the persona API.
+
+Starts fake_openai.py and the Flask app (threaded werkzeug server on a
+throwaway SQLite database) in-process, seeds personas, then drives each
+scenario with concurrent clients and reports throughput and latency
+percentiles. Nothing leaves the machine.
+
+Usage: python loadtest.py [--concurrency 16] [--duration 10] [--latency 0.5]
+                          [--scenarios list,get,create,search,prompt]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from fake_openai import start_fake_openai
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * pct / 100))]
+
+
+def call(base_url, method, path, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=120) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def scenarios(persona_ids):
+    """Scenario name -> function(rng) returning (method, path, payload)."""
+    return {
+        'list': lambda rng: ('GET', '/personas?limit=50&fields=id,name,location,annual_income', None),
+        'get': lambda rng: ('GET', f'/personas/{rng.choice(persona_ids)}', None),
+        'create': lambda rng: ('POST', '/personas', {'name': f'Load Test {rng.random():.6f}', 'location': 'Berlin',
+                                                     'annual_income': rng.randint(10000, 5000000)}),
+        'search': lambda rng: ('GET', f"/personas/search?q={rng.choice(['berlin', 'agency', 'retail'])}", None),
+        # A fresh message every time so the response cache does not hide the upstream call
+        'prompt': lambda rng: ('POST', f'/personas/{rng.choice(persona_ids)}/prompt',
+                               {'message': f'Would you buy our CRM add-on? ({rng.random():.6f})', 'cache': False}),
+    }
+
+
+def run_scenario(base_url, make_request, concurrency, duration):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            method, path, payload = make_request(rng)
+            started = time.perf_counter()
+            status = call(base_url, method, path, payload)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / wall,
+        'p50': statistics.median(latencies) if latencies else 0.0,
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'errors': errors,
+        'statuses': statuses
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario')
+    parser.add_argument('--latency', type=float, default=0.5, help='fake OpenAI latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--personas', type=int, default=1000, help='personas to seed')
+    parser.add_argument('--scenarios', default='list,get,create,search,prompt')
+    args = parser.parse_args()
+
+    fake = start_fake_openai(latency=args.latency, jitter=args.jitter)
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{fake.server_port}/v1'
+    os.environ['OPENAI_API_KEY'] = 'loadtest'
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='persona-load-'), 'load.db')}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from werkzeug.serving import make_server
+    import app as app_module
+    logging.getLogger('werkzeug').setLevel(os.environ['LOG_LEVEL'].upper())
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='app-server', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    rng = random.Random(0)
+    seed = ''.join(json.dumps({'name': f'Seed {i} {rng.choice(["Agency", "Retail", "Bakery"])}',
+                               'location': rng.choice(['Berlin', 'Munich', 'Cape Town']),
+                               'annual_income': rng.randint(10000, 5000000)}) + '\n'
+                   for i in range(args.personas))
+    urllib.request.urlopen(urllib.request.Request(base_url + '/personas/bulk', data=seed.encode('utf-8'),
+                                                  headers={'Content-Type': 'application/x-ndjson'})).read()
+    persona_ids = list(range(1, args.personas + 1))
+
+    print(f'App {base_url}, fake OpenAI latency {args.latency}s +/- {args.jitter}s, '
+          f'concurrency {args.concurrency}, {args.duration}s per scenario')
+    print(f"{'scenario':<10} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    available = scenarios(persona_ids)
+    for name in args.scenarios.split(','):
+        result = run_scenario(base_url, available[name], args.concurrency, args.duration)
+        print(f"{name:<10} {result['requests']:>9} {result['rps']:>9.1f} {result['p50']:>9.1f} "
+              f"{result['p95']:>9.1f} {result['p99']:>9.1f} {result['errors']:>7}")
+        if result['errors']:
+            print(f"           statuses: {result['statuses']}")
+
+    server.shutdown()
+    fake.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
 // State management
+const PAGE_SIZE = 50;
+const LIST_FIELDS = 'id,name,location,annual_income';
 let personas = [];
+let nextCursor = null;
+let isLoadingPage = false;
 let currentPersonaId = null;
+let currentPersona = null;
 let isEditMode = false;
 let editingPersonaId = null;
+let streamController = null;
 
 // DOM Elements
 const personaList = document.getElementById('persona-list');
@@ -41,6 +47,12 @@ function setupEventListeners() {
     closeModal.addEventListener('click', () => personaModal.style.display = 'none');
     cancelBtn.addEventListener('click', () => personaModal.style.display = 'none');
     personaForm.addEventListener('submit', handleFormSubmit);
+    personaList.addEventListener('scroll', () => {
+        // Infinite scroll: fetch the next page when nearing the bottom
+        if (personaList.scrollTop + personaList.clientHeight >= personaList.scrollHeight - 100) {
+            loadMorePersonas();
+        }
+    });
     window.addEventListener('click', (e) => {
         if (e.target === personaModal) {
             personaModal.style.display = 'none';
@@ -48,15 +60,39 @@ function setupEventListeners() {
     });
 }
 
-// Load all personas from API
+// Load the first page of personas from API
 async function loadPersonas() {
+    personas = [];
+    nextCursor = null;
+    await loadPersonaPage(null);
+}
+
+// Load the next page of personas, if there is one
+async function loadMorePersonas() {
+    if (nextCursor === null || isLoadingPage) return;
+    await loadPersonaPage(nextCursor);
+}
+
+async function loadPersonaPage(after) {
+    isLoadingPage = true;
     try {
-        const response = await fetch('/personas');
-        personas = await response.json();
+        let url = `/personas?limit=${PAGE_SIZE}&fields=${LIST_FIELDS}`;
+        if (after !== null) url += `&after=${after}`;
+        const response = await fetch(url);
+        const page = await response.json();
+        personas = personas.concat(page);
+        nextCursor = response.headers.get('X-Next-Cursor');
         renderPersonaList();
     } catch (error) {
         console.error('Error loading personas:', error);
         alert('Failed to load personas. Please refresh the page.');
+    } finally {
+        isLoadingPage = false;
+    }
+
+    // Keep filling until the list can scroll, otherwise the scroll handler never fires
+    if (nextCursor !== null && personaList.scrollHeight <= personaList.clientHeight) {
+        await loadMorePersonas();
     }
 }
 
@@ -91,11 +127,21 @@ function renderPersonaList() {
 }
 
 // Select a persona and show chat interface
-function selectPersona(personaId) {
+async function selectPersona(personaId) {
+    if (streamController) streamController.abort();
     currentPersonaId = personaId;
-    const persona = personas.find(p => p.id === personaId);
 
-    if (!persona) return;
+    // The list only carries summary fields, so fetch the full record
+    let persona;
+    try {
+        const response = await fetch(`/personas/${personaId}`);
+        if (!response.ok) return;
+        persona = await response.json();
+    } catch (error) {
+        console.error('Error loading persona:', error);
+        return;
+    }
+    currentPersona = persona;
 
     // Update UI
     noPersonaSelected.style.display = 'none';
@@ -118,7 +164,7 @@ function selectPersona(personaId) {
     renderPersonaList();
 }
 
-// Send message to OpenAI via API
+// Send message to OpenAI via API, rendering the reply as it streams in
 async function sendMessage() {
     if (!currentPersonaId) return;
 
@@ -129,35 +175,82 @@ async function sendMessage() {
     addMessageToChat('user', message);
     chatInput.value = '';
 
+    // Cancel a reply that is still streaming so the server stops generating it
+    if (streamController) streamController.abort();
+    streamController = new AbortController();
+
     // Show loading message
     const loadingMsg = addMessageToChat('loading', 'Thinking...');
+    let aiMsg = null;
 
     try {
-        const response = await fetch(`/personas/${currentPersonaId}/prompt`, {
+        const response = await fetch(`/personas/${currentPersonaId}/prompt/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ message })
+            body: JSON.stringify({ message }),
+            signal: streamController.signal
         });
 
-        const data = await response.json();
-
-        // Remove loading message
-        loadingMsg.remove();
-
-        if (response.ok) {
-            addMessageToChat('ai', data.ai_response);
-        } else {
+        if (!response.ok) {
+            const data = await response.json();
+            loadingMsg.remove();
             addMessageToChat('ai', `Error: ${data.error || 'Failed to get response'}`);
+            return;
         }
+
+        await readEventStream(response, (event, data) => {
+            if (event === 'delta') {
+                if (!aiMsg) {
+                    loadingMsg.remove();
+                    aiMsg = addMessageToChat('ai', '');
+                }
+                aiMsg.textContent += data.content;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            } else if (event === 'error') {
+                loadingMsg.remove();
+                addMessageToChat('ai', `Error: ${data.error || 'Failed to get response'}`);
+            } else if (event === 'done') {
+                loadingMsg.remove();
+                console.debug('Prompt timing:', data);
+            }
+        });
     } catch (error) {
-        console.error('Error sending message:', error);
         loadingMsg.remove();
+        if (error.name === 'AbortError') return;
+        console.error('Error sending message:', error);
         addMessageToChat('ai', 'Sorry, something went wrong. Please try again.');
     }
 }
 
+// Parse a Server-Sent Events response body, calling onEvent(event, data) per event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
+
 // Add message to chat display
 function addMessageToChat(type, text) {
     const messageDiv = document.createElement('div');
@@ -175,7 +268,7 @@ function openModal(editMode) {
 
     if (editMode) {
         modalTitle.textContent = 'Edit Persona';
-        const persona = personas.find(p => p.id === currentPersonaId);
+        const persona = currentPersona;
         if (persona) {
             editingPersonaId = persona.id;
             document.getElementById('persona-name').value = persona.name;
@@ -245,7 +338,7 @@ async function handleFormSubmit(e) {
 async function deleteCurrentPersona() {
     if (!currentPersonaId) return;
 
-    const persona = personas.find(p => p.id === currentPersonaId);
+    const persona = currentPersona;
     if (!confirm(`Are you sure you want to delete "${persona.name}"?`)) {
         return;
     }
@@ -257,6 +350,7 @@ async function deleteCurrentPersona() {
 
         if (response.ok) {
             currentPersonaId = null;
+            currentPersona = null;
             noPersonaSelected.style.display = 'flex';
             chatInterface.style.display = 'none';
             await loadPersonas();